@@ -1,11 +1,12 @@
 import os
-import sys
 import shutil
 import tempfile
-import subprocess
+import functools
 from pathlib import Path
 import logging
 
+import zip_folder
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,9 +24,11 @@ def create_test_files(test_dir: Path):
     (test_dir / "small.txt").write_text("This is a small test file")
     (test_dir / "medium.txt").write_text("This is a medium test file\n" * 1000)
     
-    # Create a large file (1MB)
-    large_content = "0" * (1024 * 1024)  # 1MB of zeros
-    (test_dir / "large.txt").write_text(large_content)
+    # Create a large file (1MB) as a sparse file: O(1) instead of
+    # materializing a 1MB string in memory first
+    large_file = test_dir / "large.txt"
+    large_file.touch()
+    os.truncate(large_file, 1024 * 1024)
     
     # Create a subdirectory with files
     subdir = test_dir / "subdir"
@@ -35,38 +38,29 @@ def create_test_files(test_dir: Path):
     logger.info(f"Created test files in {test_dir}")
 
 def run_zip_test(source_dir: Path, output_zip: Path, verify: bool = True):
-    """Run the zip_folder.py script with given parameters."""
-    cmd = [
-        sys.executable,
-        "zip_folder.py",
-        str(source_dir),
-        "--output",
-        str(output_zip)
-    ]
-    
-    if verify:
-        cmd.append("--verify")
-    
-    logger.info(f"Running command: {' '.join(cmd)}")
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    
-    if result.returncode != 0:
-        logger.error(f"Command failed with error:\n{result.stderr}")
-        return False
-    
-    logger.info(f"Command output:\n{result.stdout}")
-    return True
+    """
+    Zip source_dir via zip_folder.run, in-process: one interpreter and
+    one set of imports across all test cases instead of a subprocess
+    per case.
+    """
+    logger.info(f"Zipping {source_dir} -> {output_zip}")
+    return zip_folder.run(source_dir, output_zip, verify=verify)
+
+@functools.lru_cache(maxsize=4096)
+def _original_files(dir_str: str) -> frozenset:
+    """Walk a test directory once and cache its relative file listing."""
+    files = set()
+    for entry in zip_folder.iter_files(dir_str):
+        rel_path = os.path.relpath(entry.path, dir_str)
+        files.add(normalize_path(rel_path) if os.sep != '/' else rel_path)
+    return frozenset(files)
 
 def verify_zip_contents(zip_path: Path, original_dir: Path):
     """Verify that the zip file contains all original files."""
     import zipfile
-    
-    # Get list of original files
-    original_files = set()
-    for root, _, files in os.walk(original_dir):
-        for file in files:
-            rel_path = Path(root).relative_to(original_dir) / file
-            original_files.add(normalize_path(str(rel_path)))
+
+    # Get list of original files (cached across checks of the same dir)
+    original_files = _original_files(os.fspath(original_dir))
     
     # Get list of files in zip
     zip_files = set()
@@ -106,10 +100,10 @@ def main():
         test_dir = temp_path / "test2"
         test_dir.mkdir()
         
-        # Create a 10MB file
+        # Create a 10MB sparse file without building a 10MB bytes object
         large_file = test_dir / "10mb.txt"
-        with open(large_file, 'wb') as f:
-            f.write(b'0' * (10 * 1024 * 1024))  # 10MB
+        large_file.touch()
+        os.truncate(large_file, 10 * 1024 * 1024)
         
         output_zip = temp_path / "test2.zip"
         if run_zip_test(test_dir, output_zip):
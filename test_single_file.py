@@ -43,15 +43,15 @@ def test_single_file():
         ]
         
         logger.info(f"Running command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
         if result.returncode == 0:
             logger.info("Test successful!")
             logger.info(f"Created zip file: {output_zip}")
             logger.info(f"Created hash file: {output_zip.with_suffix('.hash')}")
         else:
             logger.error("Test failed!")
-            logger.error(f"Error output:\n{result.stderr}")
+            logger.error(f"Error output:\n{result.stderr.decode('utf-8', 'replace')}")
 
 if __name__ == '__main__':
     test_single_file() 
\ No newline at end of file
@@ -50,8 +50,8 @@ def test_specific_path(input_path: Path, verify: bool = True):
             cmd.append("--verify")
         
         logger.info(f"Running command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
         if result.returncode == 0:
             logger.info("Test successful!")
             logger.info(f"Created zip file: {output_zip}")
@@ -69,7 +69,7 @@ def test_specific_path(input_path: Path, verify: bool = True):
             logger.info(f"  - Hash file: {final_hash}")
         else:
             logger.error("Test failed!")
-            logger.error(f"Error output:\n{result.stderr}")
+            logger.error(f"Error output:\n{result.stderr.decode('utf-8', 'replace')}")
 
 def main():
     parser = argparse.ArgumentParser(description='Test zip_folder.py with a specific file or folder')